@@ -199,7 +199,7 @@ class PesterTabWindow(QtWidgets.QFrame):
 
     def updateMood(self, handle, mood, unblocked=False):
         i = self.tabIndices[handle]
-        if handle in self.mainwindow.config.getBlocklist() and not unblocked:
+        if self.mainwindow.config.isBlocked(handle) and not unblocked:
             icon = QtGui.QIcon(self.mainwindow.theme["main/chums/moods/blocked/icon"])
         else:
             icon = mood.icon(self.mainwindow.theme)
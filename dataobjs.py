@@ -1,27 +1,39 @@
 import re
+import sys
+import string
 import logging
+import functools
 from datetime import datetime
 
 PchumLog = logging.getLogger("pchumLogger")
+_INVALID_CHAR_RE = re.compile("[^A-Za-z0-9]")
+_UPPER = frozenset(string.ascii_uppercase)
+_DEFAULT_GROUP = sys.intern("Chums")
+_BLACK_HTML = "#000000"
+_BLACK_CMD = "0,0,0"
+_FALLBACK_INITIALS = "XX"
 try:
     from PyQt6 import QtGui
 except ImportError:
     print("PyQt5 fallback (dataobjs.py)")
     from PyQt5 import QtGui
 
-from mood import Mood
+from mood import MOOD_OFFLINE
 from parsetools import (
-    timeDifference,
+    timeDifference as _timeDifference,
     convertTags,
 )
 
+# Many users joining a memo at once share a time delta, so memoize the text.
+timeDifference = functools.lru_cache(maxsize=512)(_timeDifference)
+
 
 class PesterProfile:
     def __init__(
         self,
         handle,
         color=None,
-        mood=Mood("offline"),
+        mood=None,
         group=None,
         notes="",
         chumdb=None,
@@ -33,54 +45,70 @@ class PesterProfile:
             else:
                 color = QtGui.QColor("black")
         self.color = color
-        self.mood = mood
+        self.mood = mood if mood is not None else MOOD_OFFLINE
         if group is None:
             if chumdb:
-                group = chumdb.getGroup(handle, "Chums")
+                group = chumdb.getGroup(handle, _DEFAULT_GROUP)
             else:
-                group = "Chums"
+                group = _DEFAULT_GROUP
         self.group = group
         self.notes = notes
 
+    @property
+    def handle(self):
+        return self._handle
+
+    @handle.setter
+    def handle(self, value):
+        self._handle = value
+        # Initials only depend on the handle, so build them once here
+        # instead of on every formatted message.
+        if value:
+            self._initials_base = (
+                value[0] + next((c for c in value if c.isupper()), "")
+            ).upper()
+        else:
+            # Fallback for invalid string
+            PchumLog.warning("Empty handle, using fallback initials.")
+            self._initials_base = _FALLBACK_INITIALS
+
+    @property
+    def color(self):
+        return self._color
+
+    @color.setter
+    def color(self, value):
+        self._color = value
+        # Cache the string forms so formatting doesn't call into Qt each time.
+        if value:
+            self._colorhtml = value.name()
+            (r, g, b, _a) = value.getRgb()
+            self._colorcmd = "%d,%d,%d" % (r, g, b)
+        else:
+            self._colorhtml = _BLACK_HTML
+            self._colorcmd = _BLACK_CMD
+
     def initials(self, time=None):
-        handle = self.handle
-        caps = [l for l in handle if l.isupper()]
-        if not caps:
-            caps = [""]
-        PchumLog.debug("handle = %s", handle)
-        PchumLog.debug("caps = %s", caps)
-        # Fallback for invalid string
-        try:
-            initials = (handle[0] + caps[0]).upper()
-        except:
-            PchumLog.exception("")
-            initials = "XX"
-        PchumLog.debug("initials = %s", initials)
-        if hasattr(self, "time"):
-            if time:
-                if self.time > time:
-                    return "F" + initials
-                elif self.time < time:
-                    return "P" + initials
-                else:
-                    return "C" + initials
+        own_time = getattr(self, "time", None)
+        if time and own_time is not None:
+            if own_time > time:
+                return "F" + self._initials_base
+            elif own_time < time:
+                return "P" + self._initials_base
             else:
-                return initials
-        else:
-            return initials
+                return "C" + self._initials_base
+        return self._initials_base
+
+    @staticmethod
+    def _decorate(chum, grammar):
+        """Initials of chum with the timeline prefix and number from grammar."""
+        return f"{grammar.pcf}{chum._initials_base}{grammar.number}"
 
     def colorhtml(self):
-        if self.color:
-            return self.color.name()
-        else:
-            return "#000000"
+        return self._colorhtml
 
     def colorcmd(self):
-        if self.color:
-            (r, g, b, _a) = self.color.getRgb()
-            return "%d,%d,%d" % (r, g, b)
-        else:
-            return "0,0,0"
+        return self._colorcmd
 
     def plaindict(self):
         return (
@@ -88,14 +116,14 @@ class PesterProfile:
             {
                 "handle": self.handle,
                 "mood": self.mood.name(),
-                "color": str(self.color.name()),
-                "group": str(self.group),
-                "notes": str(self.notes),
+                "color": self._colorhtml,
+                "group": self.group,
+                "notes": self.notes,
             },
         )
 
     def blocked(self, config):
-        return self.handle in config.getBlocklist()
+        return config.isBlocked(self.handle)
 
     def memsg(self, syscolor, lexmsg, time=None):
         suffix = lexmsg[0].suffix
@@ -103,221 +131,141 @@ class PesterProfile:
         uppersuffix = suffix.upper()
         if time is not None:
             handle = f"{time.temporal} {self.handle}"
-            initials = time.pcf + self.initials() + time.number + uppersuffix
+            initials = f"{self._decorate(self, time)}{uppersuffix}"
         else:
             handle = self.handle
-            initials = self.initials() + uppersuffix
-        return "<c={}>-- {}{} <c={}>[{}]</c> {} --</c>".format(
-            syscolor.name(),
-            handle,
-            suffix,
-            self.colorhtml(),
-            initials,
-            msg,
+            initials = f"{self._initials_base}{uppersuffix}"
+        return (
+            f"<c={syscolor.name()}>-- {handle}{suffix} "
+            f"<c={self._colorhtml}>[{initials}]</c> {msg} --</c>"
         )
 
     def pestermsg(self, otherchum, syscolor, verb):
-        return "<c={}>-- {} <c={}>[{}]</c> {} {} <c={}>[{}]</c> at {} --</c>".format(
-            syscolor.name(),
-            self.handle,
-            self.colorhtml(),
-            self.initials(),
-            verb,
-            otherchum.handle,
-            otherchum.colorhtml(),
-            otherchum.initials(),
-            datetime.now().strftime("%H:%M"),
+        now = datetime.now()
+        return (
+            f"<c={syscolor.name()}>-- {self.handle} "
+            f"<c={self._colorhtml}>[{self._initials_base}]</c> {verb} "
+            f"{otherchum.handle} "
+            f"<c={otherchum._colorhtml}>[{otherchum._initials_base}]</c> "
+            f"at {now.hour:02d}:{now.minute:02d} --</c>"
         )
 
     def moodmsg(self, mood, syscolor, theme):
+        moodname = mood.name()
+        icon = theme.moodIconUrl(moodname)
         return (
-            '<c=%s>-- %s <c=%s>[%s]</c> changed their mood to %s <img src="%s" /> --</c>'
-            % (
-                syscolor.name(),
-                self.handle,
-                self.colorhtml(),
-                self.initials(),
-                mood.name().upper(),
-                theme["main/chums/moods"][mood.name()]["icon"].replace(" ", "%20"),
-            )
+            f"<c={syscolor.name()}>-- {self.handle} "
+            f"<c={self._colorhtml}>[{self._initials_base}]</c> "
+            f'changed their mood to {moodname.upper()} <img src="{icon}" /> --</c>'
         )
 
     def idlemsg(self, syscolor, verb):
-        return "<c={}>-- {} <c={}>[{}]</c> {} --</c>".format(
-            syscolor.name(),
-            self.handle,
-            self.colorhtml(),
-            self.initials(),
-            verb,
+        return (
+            f"<c={syscolor.name()}>-- {self.handle} "
+            f"<c={self._colorhtml}>[{self._initials_base}]</c> {verb} --</c>"
         )
 
-    def memoclosemsg(self, syscolor, initials, verb):
-        if isinstance(initials, list):
-            return "<c={}><c={}>{}</c> {}.</c>".format(
-                syscolor.name(),
-                self.colorhtml(),
-                ", ".join(initials),
-                verb,
-            )
-        return "<c={}><c={}>{}{}{}</c> {}.</c>".format(
-            syscolor.name(),
-            self.colorhtml(),
-            initials.pcf,
-            self.initials(),
-            initials.number,
-            verb,
+    def memoclosemsg(self, syscolor, grammar, verb):
+        return (
+            f"<c={syscolor.name()}><c={self._colorhtml}>"
+            f"{self._decorate(self, grammar)}</c> {verb}.</c>"
+        )
+
+    def memoclosemsg_multi(self, syscolor, initials, verb):
+        return (
+            f"<c={syscolor.name()}><c={self._colorhtml}>"
+            f"{', '.join(initials)}</c> {verb}.</c>"
         )
 
     def memonetsplitmsg(self, syscolor, initials):
         if len(initials) <= 0:
-            return "<c=%s>Netsplit quits: <c=black>None</c></c>" % (syscolor.name())
+            return f"<c={syscolor.name()}>Netsplit quits: <c=black>None</c></c>"
         else:
-            return "<c={}>Netsplit quits: <c=black>{}</c></c>".format(
-                syscolor.name(),
-                ", ".join(initials),
+            return (
+                f"<c={syscolor.name()}>Netsplit quits: "
+                f"<c=black>{', '.join(initials)}</c></c>"
             )
 
     def memoopenmsg(self, syscolor, td, timeGrammar, verb, channel):
         """timeGrammar.temporal and timeGrammar.when are unused"""
         timetext = timeDifference(td)
-        PchumLog.debug("pre pcf+self.initials()")
-        initials = timeGrammar.pcf + self.initials()
-        PchumLog.debug("post pcf+self.initials()")
-        return "<c={}><c={}>{}</c> {} {} {}.</c>".format(
-            syscolor.name(),
-            self.colorhtml(),
-            initials,
-            timetext,
-            verb,
-            channel[1:].upper().replace("_", " "),
+        initials = timeGrammar.pcf + self._initials_base
+        return (
+            f"<c={syscolor.name()}><c={self._colorhtml}>{initials}</c> "
+            f"{timetext} {verb} {channel[1:].upper().replace('_', ' ')}.</c>"
         )
 
     def memobanmsg(self, opchum, opgrammar, syscolor, initials, reason):
-        opinit = opgrammar.pcf + opchum.initials() + opgrammar.number
-        if isinstance(initials, list):
-            if opchum.handle == reason:
-                return (
-                    "<c={}>{}</c> banned <c={}>{}</c> from responding to memo.".format(
-                        opchum.colorhtml(),
-                        opinit,
-                        self.colorhtml(),
-                        ", ".join(initials),
-                    )
-                )
-            else:
-                return (
-                    "<c=%s>%s</c> banned <c=%s>%s</c> from responding to memo: <c=black>[%s]</c>."
-                    % (
-                        opchum.colorhtml(),
-                        opinit,
-                        self.colorhtml(),
-                        ", ".join(initials),
-                        reason,
-                    )
-                )
-        else:
-            PchumLog.exception("")
-            initials = self.initials()
-            if opchum.handle == reason:
-                return "<c=%s>%s</c> banned <c=%s>%s</c> from responding to memo." % (
-                    opchum.colorhtml(),
-                    opinit,
-                    self.colorhtml(),
-                    initials,
-                )
-            else:
-                return (
-                    "<c=%s>%s</c> banned <c=%s>%s</c> from responding to memo: <c=black>[%s]</c>."
-                    % (
-                        opchum.colorhtml(),
-                        opinit,
-                        self.colorhtml(),
-                        initials,
-                        reason,
-                    )
-                )
+        """initials is a list of every timeline initial being banned."""
+        tail = "" if opchum.handle == reason else f": <c=black>[{reason}]</c>"
+        return (
+            f"<c={opchum._colorhtml}>{self._decorate(opchum, opgrammar)}</c> banned "
+            f"<c={self._colorhtml}>{', '.join(initials)}</c> "
+            f"from responding to memo{tail}."
+        )
 
     # As far as I'm aware, there's no IRC reply for this, this seems impossible to check for in practice.
     def memopermabanmsg(self, opchum, opgrammar, syscolor, timeGrammar):
-        initials = timeGrammar.pcf + self.initials() + timeGrammar.number
-        opinit = opgrammar.pcf + opchum.initials() + opgrammar.number
-        return "<c={}>{}</c> permabanned <c={}>{}</c> from the memo.".format(
-            opchum.colorhtml(),
-            opinit,
-            self.colorhtml(),
-            initials,
+        initials = self._decorate(self, timeGrammar)
+        opinit = self._decorate(opchum, opgrammar)
+        return (
+            f"<c={opchum._colorhtml}>{opinit}</c> permabanned "
+            f"<c={self._colorhtml}>{initials}</c> from the memo."
         )
 
     def memojoinmsg(self, syscolor, td, timeGrammar, verb):
         # (temporal, pcf, when) = (timeGrammar.temporal, timeGrammar.pcf, timeGrammar.when)
         timetext = timeDifference(td)
-        initials = timeGrammar.pcf + self.initials() + timeGrammar.number
-        return "<c={}><c={}>{} {} [{}]</c> {} {}.</c>".format(
-            syscolor.name(),
-            self.colorhtml(),
-            timeGrammar.temporal,
-            self.handle,
-            initials,
-            timetext,
-            verb,
+        initials = self._decorate(self, timeGrammar)
+        return (
+            f"<c={syscolor.name()}><c={self._colorhtml}>{timeGrammar.temporal} "
+            f"{self.handle} [{initials}]</c> {timetext} {verb}.</c>"
         )
 
     def memoopmsg(self, opchum, opgrammar, syscolor):
-        opinit = opgrammar.pcf + opchum.initials() + opgrammar.number
-        return "<c={}>{}</c> made <c={}>{}</c> an OP.".format(
-            opchum.colorhtml(),
-            opinit,
-            self.colorhtml(),
-            self.initials(),
+        opinit = self._decorate(opchum, opgrammar)
+        return (
+            f"<c={opchum._colorhtml}>{opinit}</c> made "
+            f"<c={self._colorhtml}>{self._initials_base}</c> an OP."
         )
 
     def memodeopmsg(self, opchum, opgrammar, syscolor):
-        opinit = opgrammar.pcf + opchum.initials() + opgrammar.number
-        return "<c={}>{}</c> took away <c={}>{}</c>'s OP powers.".format(
-            opchum.colorhtml(),
-            opinit,
-            self.colorhtml(),
-            self.initials(),
+        opinit = self._decorate(opchum, opgrammar)
+        return (
+            f"<c={opchum._colorhtml}>{opinit}</c> took away "
+            f"<c={self._colorhtml}>{self._initials_base}</c>'s OP powers."
         )
 
     def memovoicemsg(self, opchum, opgrammar, syscolor):
-        opinit = opgrammar.pcf + opchum.initials() + opgrammar.number
-        return "<c={}>{}</c> gave <c={}>{}</c> voice.".format(
-            opchum.colorhtml(),
-            opinit,
-            self.colorhtml(),
-            self.initials(),
+        opinit = self._decorate(opchum, opgrammar)
+        return (
+            f"<c={opchum._colorhtml}>{opinit}</c> gave "
+            f"<c={self._colorhtml}>{self._initials_base}</c> voice."
         )
 
     def memodevoicemsg(self, opchum, opgrammar, syscolor):
-        opinit = opgrammar.pcf + opchum.initials() + opgrammar.number
-        return "<c={}>{}</c> took away <c={}>{}</c>'s voice.".format(
-            opchum.colorhtml(),
-            opinit,
-            self.colorhtml(),
-            self.initials(),
+        opinit = self._decorate(opchum, opgrammar)
+        return (
+            f"<c={opchum._colorhtml}>{opinit}</c> took away "
+            f"<c={self._colorhtml}>{self._initials_base}</c>'s voice."
         )
 
     def memomodemsg(self, opchum, opgrammar, syscolor, modeverb, modeon):
-        opinit = opgrammar.pcf + opchum.initials() + opgrammar.number
+        opinit = self._decorate(opchum, opgrammar)
         if modeon:
             modeon = "now"
         else:
             modeon = "no longer"
-        return "<c={}>Memo is {} <c=black>{}</c> by <c={}>{}</c></c>".format(
-            syscolor.name(),
-            modeon,
-            modeverb,
-            opchum.colorhtml(),
-            opinit,
+        return (
+            f"<c={syscolor.name()}>Memo is {modeon} <c=black>{modeverb}</c> "
+            f"by <c={opchum._colorhtml}>{opinit}</c></c>"
         )
 
     def memoquirkkillmsg(self, opchum, opgrammar, syscolor):
-        opinit = opgrammar.pcf + opchum.initials() + opgrammar.number
-        return "<c={}><c={}>{}</c> turned off your quirk.</c>".format(
-            syscolor.name(),
-            opchum.colorhtml(),
-            opinit,
+        opinit = self._decorate(opchum, opgrammar)
+        return (
+            f"<c={syscolor.name()}><c={opchum._colorhtml}>{opinit}</c> "
+            "turned off your quirk.</c>"
         )
 
     @staticmethod
@@ -326,15 +274,22 @@ class PesterProfile:
 
     @staticmethod
     def checkValid(handle):
-        caps = [l for l in handle if l.isupper()]
-        if len(caps) != 1:
+        if not handle:
             return (False, "Must have exactly 1 uppercase letter")
         if handle[0].isupper():
             return (False, "Cannot start with uppercase letter")
-        if re.search("[^A-Za-z0-9]", handle) is not None:
-            return (False, "Only alphanumeric characters allowed")
         if handle[0].isnumeric():  # IRC doesn't allow this
             return (False, "Handles may not start with a number")
+        caps = 0
+        for c in handle:
+            if c in _UPPER:
+                caps += 1
+                if caps > 1:
+                    break
+        if caps != 1:
+            return (False, "Must have exactly 1 uppercase letter")
+        if _INVALID_CHAR_RE.search(handle) is not None:
+            return (False, "Only alphanumeric characters allowed")
         return (True,)
 
 
@@ -354,9 +309,10 @@ class PesterHistory:
         return text
 
     def prev(self):
+        n = len(self.history)
         self.current += 1
-        if self.current >= len(self.history):
-            self.current = len(self.history)
+        if self.current >= n:
+            self.current = n
             return self.retrieve()
         return self.history[self.current]
 
@@ -371,6 +327,6 @@ class PesterHistory:
         return self.saved
 
     def add(self, text):
-        if len(self.history) == 0 or text != self.history[len(self.history) - 1]:
+        if not self.history or text != self.history[-1]:
             self.history.append(text)
         self.reset()
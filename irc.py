@@ -28,6 +28,8 @@ the license notice included with oyoyo source files is indented here:
     # THE SOFTWARE.
 """
 
+import re
+import sys
 import time
 import socket
 import random
@@ -40,7 +42,7 @@ except ImportError:
     print("PyQt5 fallback (irc.py)")
     from PyQt5 import QtCore, QtGui
 
-from mood import Mood
+from mood import Mood, MOOD_OFFLINE
 from dataobjs import PesterProfile
 from generic import PesterList
 from version import _pcVersion
@@ -49,7 +51,23 @@ from scripts.ssl_context import get_ssl_context
 from scripts.input_validation import is_valid_mood, is_valid_rgb_color
 
 PchumLog = logging.getLogger("pchumLogger")
-from scripts.services import SERVICES
+from scripts.services import SERVICES_CF
+
+_TAGMSG = sys.intern("tagmsg")
+_CTAG_RE = re.compile(r"<c[^>]*>|</c>")
+# Upper bound on targets per PRIVMSG, keeps lines well under 512 bytes.
+_MAX_PRIVMSG_TARGETS = 10
+# Channel modes supported by UnrealIRCd, in the order they're applied.
+_UNREAL_CHAN_MODES = "cCdfGHikKLlmMNnOPpQRrsSTtVzZ"
+_UNREAL_CHAN_MODE_SET = frozenset(_UNREAL_CHAN_MODES)
+# User modes set by the server itself, skipped when a MODE has no handles.
+_SERVER_MODE_FLAGS = frozenset("xzo")
+# A '+' or '-' followed by the modes it applies to, e.g. "+ov" in "+ov-b".
+_MODE_BLOCK_RE = re.compile(r"([+-]?)([^+-]*)")
+# Valid values of a +pesterchum message tag that map to a PESTERCHUM: command.
+_PESTER_VERBS = frozenset(
+    ["BEGIN", "BLOCK", "CEASE", "BLOCKED", "UNBLOCK", "IDLE", "ME"]
+)
 
 
 class PesterIRC(QtCore.QThread):
@@ -75,19 +93,26 @@ class PesterIRC(QtCore.QThread):
         self.verify_hostname = (
             verify_hostname  # Whether to verify server hostname. (SSL-only)
         )
+        # Last two labels of the server's domain, netsplit quit reasons contain it twice.
+        self._baseserver = server[server.rfind(".", 0, server.rfind(".")) :]
 
         self._send_irc = SendIRC()
 
         self.unresponsive = False
         self.registered_irc = False
         self.metadata_supported = False
+        self.privmsg_targmax = 1  # Targets per PRIVMSG, raised by TARGMAX in 005.
         self.stop_irc = None
         self._conn = None
         self._end = False  # Set to True when ending connection.
+        self._recv_size = 16384  # Max bytes per recv() call.
         self.joined = False
-        self.channelnames = {}
+        self.channelnames = {}  # NAMES replies so far, keyed by casefolded channel.
+        self.channel_display = {}  # Channel name as capitalized in NAMES replies.
         self.channel_list = []
+        self._channel_set = set()  # Channel names already in self.channel_list.
         self.channel_field = None
+        self._random_nick_numbers = []  # Unused pesterClient numbers, see _reset_nick.
 
         # Dict for connection server commands/replies to handling functions.
         self.commands = {
@@ -100,6 +125,7 @@ class PesterIRC(QtCore.QThread):
             "324": self._channelmodeis,
             "353": self._namreply,
             "366": self._endofnames,
+            "407": self._toomanytargets,
             "432": self._erroneusnickname,
             "433": self._nicknameinuse,
             "436": self._nickcollision,
@@ -130,6 +156,14 @@ class PesterIRC(QtCore.QThread):
             "cap": self._cap,  # IRCv3 Client Capability Negotiation
             "authenticate": self._authenticate,  # IRCv3 SASL authentication
         }
+        # Dict for CTCP commands wrapped in a PRIVMSG to handling functions.
+        self.ctcp_commands = {
+            "ACTION": self._ctcp_action,
+            "VERSION": self._ctcp_version,
+            "CLIENTINFO": self._ctcp_clientinfo,
+            "PING": self._ctcp_ping,
+            "SOURCE": self._ctcp_source,
+        }
 
     def run(self):
         """Implements the main loop for the thread.
@@ -144,7 +178,6 @@ class PesterIRC(QtCore.QThread):
         while True:
             res = True
             try:
-                PchumLog.debug("update_irc()")
                 self.mainwindow.sincerecv = 0
                 res = self.update_irc()
             except socket.timeout as timeout:
@@ -173,11 +206,12 @@ class PesterIRC(QtCore.QThread):
 
         # Open connection
         plaintext_socket = socket.create_connection((self.server, self.port))
+        # IRC lines are small and written whole, so Nagle's algorithm only adds latency.
+        plaintext_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
         if self.ssl:
             # Upgrade connection to use SSL/TLS if enabled
-            context = get_ssl_context()
-            context.check_hostname = verify_hostname
+            context = get_ssl_context(verify_hostname)
             self.socket = context.wrap_socket(
                 plaintext_socket, server_hostname=self.server
             )
@@ -187,6 +221,8 @@ class PesterIRC(QtCore.QThread):
 
         self.socket.settimeout(90)
         self._send_irc.socket = self.socket
+        # Read a full TLS record at a time over SSL, larger chunks otherwise.
+        self._recv_size = 16384 if self.ssl else 65536
 
         if self.password:
             self._send_irc.pass_(self.password)
@@ -222,7 +258,7 @@ class PesterIRC(QtCore.QThread):
         tries = 0
         while True:
             try:
-                return self.socket.recv(1024)
+                return self.socket.recv(self._recv_size)
             except OSError as err:
                 PchumLog.error(err)
                 tries += 1
@@ -233,13 +269,13 @@ class PesterIRC(QtCore.QThread):
     def _conn_generator(self):
         """Returns a generator object."""
         try:
-            buffer = b""
+            buffer = bytearray()
             while not self._end:
                 if not self.socket or self.socket.fileno() == -1:
                     self._end = True
                     break
                 try:
-                    buffer += self._get_stuffs_from_socket()
+                    buffer.extend(self._get_stuffs_from_socket())
                 except OSError as socket_exception:
                     PchumLog.warning(
                         "Socket exception in conn_generator: '%s'.", socket_exception
@@ -250,20 +286,23 @@ class PesterIRC(QtCore.QThread):
                 else:
                     if self._end:
                         break
-                    split_buffer = buffer.split(b"\r\n")
-                    buffer = b""
-                    if split_buffer[-1]:
-                        # Incomplete line, add it back to the buffer.
-                        buffer = split_buffer.pop()
-                    for line in split_buffer:
-                        line = line.decode(encoding="utf-8", errors="replace")
+                    start = 0
+                    end = buffer.find(b"\r\n")
+                    while end != -1:
+                        line = buffer[start:end].decode(
+                            encoding="utf-8", errors="replace"
+                        )
+                        start = end + 2
+                        end = buffer.find(b"\r\n", start)
                         tags, prefix, command, args = parse_irc_line(line)
                         if command:
                             # Only need tags with tagmsg
-                            if command.casefold() == "tagmsg":
+                            if command is _TAGMSG:
                                 self._run_command(command, prefix, tags, *args)
                             else:
                                 self._run_command(command, prefix, *args)
+                    # Keep any incomplete line in the buffer.
+                    del buffer[:start]
                 yield True
         except OSError as socket_exception:
             PchumLog.warning(
@@ -281,10 +320,10 @@ class PesterIRC(QtCore.QThread):
 
     def _run_command(self, command, *args):
         """Finds and runs a command if it has a matching function in the self.commands dict."""
-        PchumLog.debug("_run_command %s(%s)", command, args)
-        if command in self.commands:
-            command_function = self.commands[command]
-        else:
+        if PchumLog.isEnabledFor(logging.DEBUG):
+            PchumLog.debug("_run_command %s(%s)", command, args)
+        command_function = self.commands.get(command)
+        if command_function is None:
             PchumLog.debug("No matching function for command: %s(%s)", command, args)
             return
         try:
@@ -371,21 +410,30 @@ class PesterIRC(QtCore.QThread):
             PchumLog.warning(
                 "Server doesn't seem to support metadata, using legacy GETMOOD."
             )
-            chumglub = "GETMOOD "
+            handles = []
+            length = len("GETMOOD ")
             for chum in chums:
-                if len(chumglub + chum.handle) >= 350:
+                handle = chum.handle
+                # No point in GETMOOD-ing services
+                if handle.casefold() in SERVICES_CF:
+                    continue
+                if length + len(handle) + 1 >= 350:
                     try:
-                        self._send_irc.privmsg("#pesterchum", chumglub)
+                        self._send_irc.privmsg(
+                            "#pesterchum", "GETMOOD " + " ".join(handles)
+                        )
                     except OSError as e:
                         PchumLog.warning(e)
                         self.set_connection_broken()
-                    chumglub = "GETMOOD "
-                # No point in GETMOOD-ing services
-                if chum.handle.casefold() not in SERVICES:
-                    chumglub += chum.handle
-            if chumglub != "GETMOOD ":
+                    handles.clear()
+                    length = len("GETMOOD ")
+                handles.append(handle)
+                length += len(handle) + 1
+            if handles:
                 try:
-                    self._send_irc.privmsg("#pesterchum", chumglub)
+                    self._send_irc.privmsg(
+                        "#pesterchum", "GETMOOD " + " ".join(handles)
+                    )
                 except OSError as e:
                     PchumLog.warning(e)
                     self.set_connection_broken()
@@ -403,47 +451,38 @@ class PesterIRC(QtCore.QThread):
     @QtCore.pyqtSlot(str, str)
     def send_message(self, text, handle):
         """......sends a message? this is a tad silly;;;"""
-        textl = [text]
-
-        def splittext(l):
-            if len(l[0]) > 450:
-                space = l[0].rfind(" ", 0, 430)
-                if space == -1:
-                    space = 450
-                elif l[0][space + 1 : space + 5] == "</c>":
-                    space = space + 4
-                a = l[0][0 : space + 1]
-                b = l[0][space + 1 :]
-                if a.count("<c") > a.count("</c>"):
-                    # oh god ctags will break!! D=
-                    hanging = []
-                    usedends = []
-                    c = a.rfind("<c")
-                    while c != -1:
-                        d = a.find("</c>", c)
-                        while d in usedends:
-                            d = a.find("</c>", d + 1)
-                        if d != -1:
-                            usedends.append(d)
-                        else:
-                            f = a.find(">", c) + 1
-                            hanging.append(a[c:f])
-                        c = a.rfind("<c", 0, c)
-
-                    # end all ctags in first part
-                    for _ in range(a.count("<c") - a.count("</c>")):
-                        a = a + "</c>"
-                    # start them up again in the second part
-                    for c in hanging:
-                        b = c + b
-                if b:  # len > 0
-                    return [a] + splittext([b])
-                return [a]
-            return l
-
-        textl = splittext(textl)
-        for t in textl:
-            self._send_irc.privmsg(handle, t)
+        textl = []
+        while len(text) > 450:
+            space = text.rfind(" ", 0, 430)
+            if space == -1:
+                space = 450
+            elif text[space + 1 : space + 5] == "</c>":
+                space = space + 4
+            a = text[0 : space + 1]
+            b = text[space + 1 :]
+            # Find ctags left open in the first part, so they don't break.
+            hanging = []
+            for ctag in _CTAG_RE.finditer(a):
+                if ctag.group() != "</c>":
+                    hanging.append(ctag.group())
+                elif hanging:
+                    hanging.pop()
+            reopened = "".join(hanging)
+            # Carrying ctags over must leave the text shorter than it was,
+            # otherwise a first part made of only ctags would loop forever.
+            if hanging and len(reopened) < len(a):
+                # end all ctags in first part
+                a += "</c>" * len(hanging)
+                # start them up again in the second part
+                b = reopened + b
+            textl.append(a)
+            text = b
+        if text or not textl:
+            textl.append(text)
+
+        with self._send_irc.batch():
+            for t in textl:
+                self._send_irc.privmsg(handle, t)
 
     @QtCore.pyqtSlot(str, str)
     def send_ctcp(self, handle, text):
@@ -475,14 +514,18 @@ class PesterIRC(QtCore.QThread):
     def update_color(self):
         """Update and send color, slot is called from main thread."""
         # Update color metadata field
-        color = self.mainwindow.profile().color
-        self._send_irc.metadata("*", "set", "color", color.name())
-        # Send color messages
-        for convo in list(self.mainwindow.convos.keys()):
-            self._send_irc.privmsg(
-                convo,
-                f"COLOR >{self.mainwindow.profile().colorcmd()}",
-            )
+        profile = self.mainwindow.profile()
+        self._send_irc.metadata("*", "set", "color", profile.colorhtml())
+        # Send color messages, several convos per PRIVMSG if the server allows it.
+        colorcmd = profile.colorcmd()
+        convos = tuple(self.mainwindow.convos)
+        step = self.privmsg_targmax
+        with self._send_irc.batch():
+            for index in range(0, len(convos), step):
+                self._send_irc.privmsg(
+                    ",".join(convos[index : index + step]),
+                    f"COLOR >{colorcmd}",
+                )
 
     @QtCore.pyqtSlot(str)
     def blocked_chum(self, handle):
@@ -571,12 +614,12 @@ class PesterIRC(QtCore.QThread):
 
     def _notice(self, nick, chan, msg):
         """Standard IRC 'NOTICE' message, primarily used for automated replies from services."""
-        handle = nick[0 : nick.find("!")]
+        handle = nick.partition("!")[0]
         PchumLog.info('---> recv "NOTICE %s :%s"', handle, msg)
         if (
             handle == "ChanServ"
             and chan == self.mainwindow.profile().handle
-            and msg[0:2] == "[#"
+            and msg.startswith("[#")
         ):
             self.memoReceived.emit(msg[1 : msg.index("]")], handle, msg)
         else:
@@ -623,16 +666,7 @@ class PesterIRC(QtCore.QThread):
                     return
                 PchumLog.info("Pesterchum tag: %s=%s", key, value)
                 # PESTERCHUM: syntax check
-                if value in [
-                    "BEGIN",
-                    "BLOCK",
-                    "CEASE",
-                    "BLOCK",
-                    "BLOCKED",
-                    "UNBLOCK",
-                    "IDLE",
-                    "ME",
-                ]:
+                if value in _PESTER_VERBS:
                     # Process like it's a PESTERCHUM: PRIVMSG
                     msg = "PESTERCHUM:" + value
                     self._privmsg(prefix, args[0], msg)
@@ -661,45 +695,57 @@ class PesterIRC(QtCore.QThread):
         self.stop_irc = self.stop_irc.strip()
         self.disconnect_irc()
 
-    def __ctcp(self, nick: str, chan: str, msg: str):
+    def __ctcp(self, handle: str, chan: str, msg: str):
         """Client-to-client protocol handling.
 
         Called by _privmsg. CTCP messages are PRIVMSG messages wrapped in '\x01' characters.
+        handle is the sender's nick, already split from the rest of the prefix.
         """
-        msg = msg.strip("\x01")  # We already know this is a CTCP message.
-        handle = nick[0 : nick.find("!")]
-        # ACTION, IRC /me (The CTCP kind)
-        if msg.startswith("ACTION "):
-            self._privmsg(nick, chan, f"/me {msg[7:]}")
-        # VERSION, return version.
-        elif msg.startswith("VERSION"):
-            self._send_irc.ctcp_reply(handle, "VERSION", f"Pesterchum {_pcVersion}")
-        # CLIENTINFO, return supported CTCP commands.
-        elif msg.startswith("CLIENTINFO"):
-            self._send_irc.ctcp_reply(
-                handle,
-                "CLIENTINFO",
-                "ACTION VERSION CLIENTINFO PING SOURCE NOQUIRKS",
-            )
-        # PING, return pong.
-        elif msg.startswith("PING"):
-            self._send_irc.ctcp_reply(handle, "PING", msg[4:])
-        # SOURCE, return source code link.
-        elif msg.startswith("SOURCE"):
-            self._send_irc.ctcp_reply(
-                handle,
-                "SOURCE",
-                "https://github.com/Dpeta/pesterchum-alt-servers",
+        # We already know this is a CTCP message, the closing '\x01' is optional.
+        msg = msg[1:-1] if msg.endswith("\x01") else msg[1:]
+        command, _, params = msg.partition(" ")
+        ctcp_function = self.ctcp_commands.get(command)
+        if ctcp_function is None:
+            # ???
+            PchumLog.warning(
+                "Unknown CTCP command '%s' from %s to %s", msg, handle, chan
             )
-        # ???
-        else:
-            PchumLog.warning("Unknown CTCP command '%s' from %s to %s", msg, nick, chan)
+            return
+        ctcp_function(handle, chan, params)
+
+    def _ctcp_action(self, handle, chan, params):
+        """ACTION, IRC /me (The CTCP kind)"""
+        self._privmsg(handle, chan, f"/me {params}")
+
+    def _ctcp_version(self, handle, _chan, _params):
+        """VERSION, return version."""
+        self._send_irc.ctcp_reply(handle, "VERSION", f"Pesterchum {_pcVersion}")
+
+    def _ctcp_clientinfo(self, handle, _chan, _params):
+        """CLIENTINFO, return supported CTCP commands."""
+        self._send_irc.ctcp_reply(
+            handle,
+            "CLIENTINFO",
+            "ACTION VERSION CLIENTINFO PING SOURCE NOQUIRKS",
+        )
+
+    def _ctcp_ping(self, handle, _chan, params):
+        """PING, return pong."""
+        self._send_irc.ctcp_reply(handle, "PING", params)
+
+    def _ctcp_source(self, handle, _chan, _params):
+        """SOURCE, return source code link."""
+        self._send_irc.ctcp_reply(
+            handle,
+            "SOURCE",
+            "https://github.com/Dpeta/pesterchum-alt-servers",
+        )
 
     def _privmsg(self, nick: str, chan: str, msg: str):
         """'PRIVMSG' message from server, the standard message."""
         if not msg:  # Length 0
             return
-        handle = nick[0 : nick.find("!")]
+        handle = nick.partition("!")[0]
         chan = (
             chan.lower()
         )  # Channel capitalization not guarenteed, casefold() too aggressive.
@@ -707,7 +753,7 @@ class PesterIRC(QtCore.QThread):
         # CTCP, indicated by a message wrapped in '\x01' characters.
         # Only checking for the first character is recommended by the protocol.
         if msg[0] == "\x01":
-            self.__ctcp(nick, chan, msg)
+            self.__ctcp(handle, chan, msg)
             return
 
         if chan.startswith("#"):
@@ -724,9 +770,9 @@ class PesterIRC(QtCore.QThread):
                         mood = Mood(0)
                     self.moodUpdated.emit(handle, mood)
                 elif msg.startswith("GETMOOD"):
-                    mychumhandle = self.mainwindow.profile().handle
-                    if mychumhandle in msg:
-                        mymood = self.mainwindow.profile().mood.value_str()
+                    profile = self.mainwindow.profile()
+                    if profile.handle in msg:
+                        mymood = profile.mood.value_str()
                         self._send_irc.privmsg("#pesterchum", f"MOOD >{mymood}")
             else:
                 if msg.startswith("PESTERCHUM:TIME>"):
@@ -750,22 +796,20 @@ class PesterIRC(QtCore.QThread):
 
     def _quit(self, nick, reason):
         """QUIT message from server, a client has quit the server."""
-        handle = nick[0 : nick.find("!")]
+        handle = nick.partition("!")[0]
         PchumLog.info('---> recv "QUIT %s: %s"', handle, reason)
         if handle == self.mainwindow.randhandler.randNick:
             self.mainwindow.randhandler.setRunning(False)
             self.updateRandomEncounter.emit()
-        server = self.mainwindow.config.server()
-        baseserver = server[server.rfind(".", 0, server.rfind(".")) :]
-        if reason.count(baseserver) == 2:
+        if reason.count(self._baseserver) == 2:
             self.userPresentUpdate.emit(handle, "", "netsplit")
         else:
             self.userPresentUpdate.emit(handle, "", "quit")
-        self.moodUpdated.emit(handle, Mood("offline"))
+        self.moodUpdated.emit(handle, MOOD_OFFLINE)
 
     def _kick(self, channel_operator, channel, handle, reason):
         """'KICK' message from server, someone got kicked from a channel."""
-        channel_operator_nick = channel_operator[0 : channel_operator.find("!")]
+        channel_operator_nick = channel_operator.partition("!")[0]
         self.userPresentUpdate.emit(
             handle, channel, f"kick:{channel_operator_nick}:{reason}"
         )
@@ -773,15 +817,15 @@ class PesterIRC(QtCore.QThread):
 
     def _part(self, nick, channel, _reason="nanchos"):
         """'PART' message from server, someone left a channel."""
-        handle = nick[0 : nick.find("!")]
+        handle = nick.partition("!")[0]
         PchumLog.info('---> recv "PART %s: %s"', handle, channel)
         self.userPresentUpdate.emit(handle, channel, "left")
         if channel == "#pesterchum":
-            self.moodUpdated.emit(handle, Mood("offline"))
+            self.moodUpdated.emit(handle, MOOD_OFFLINE)
 
     def _join(self, nick, channel):
         """'JOIN' message from server, someone joined a channel."""
-        handle = nick[0 : nick.find("!")]
+        handle = nick.partition("!")[0]
         PchumLog.info('---> recv "JOIN %s: %s"', handle, channel)
         self.userPresentUpdate.emit(handle, channel, "join")
         if channel == "#pesterchum":
@@ -798,6 +842,8 @@ class PesterIRC(QtCore.QThread):
 
         if not handles:  # len 0
             handles = [""]
+        # Collected (handle, channel, update) tuples, emitted as a single batch.
+        updates = []
 
         # Channel section
         # Okay so, as I understand it channel modes will always be applied to a
@@ -810,48 +856,50 @@ class PesterIRC(QtCore.QThread):
         # but since it doesn't seem to cause a crash it's probably an improvement.
         # This might be clunky with non-unrealircd IRC servers
         channel_mode = ""
-        unrealircd_channel_modes = "cCdfGHikKLlmMNnOPpQRrsSTtVzZ"
-        if any(md in mode_msg for md in unrealircd_channel_modes):
+        present_channel_modes = _UNREAL_CHAN_MODE_SET.intersection(mode_msg)
+        if present_channel_modes:
             PchumLog.debug("Channel mode in string.")
-            modes = list(self.mainwindow.modes)
-            for md in unrealircd_channel_modes:
-                if mode_msg.find(md) != -1:  # -1 means not found
-                    if mode_msg[0] == "+":
-                        modes.extend(md)
-                        channel_mode = "+" + md
-                    elif mode_msg[0] == "-":
-                        try:
-                            modes.remove(md)
-                            channel_mode = "-" + md
-                        except ValueError:
-                            PchumLog.warning(
-                                "Can't remove channel mode that isn't set."
-                            )
-                    self.userPresentUpdate.emit("", channel, f"{channel_mode}:{op}")
-                    mode_msg = mode_msg.replace(md, "")
-            modes.sort()
-            self.mainwindow.modes = "+" + "".join(modes)
-
-        modes = []
-        cur = "+"
-        for l in mode_msg:
-            if l in ["+", "-"]:
-                cur = l
-            else:
-                modes.append(f"{cur}{l}")
-        for index, mode in enumerate(modes):
-            # Server-set usermodes don't need to be passed.
-            if not (handles == [""]) & (("x" in mode) | ("z" in mode) | ("o" in mode)):
-                try:
-                    self.userPresentUpdate.emit(handles[index], channel, f"{mode}:{op}")
-                except IndexError as index_except:
-                    PchumLog.exception("modeSetIndexError: %s", index_except)
+            modes = set(self.mainwindow.modes.lstrip("+"))
+            for md in _UNREAL_CHAN_MODES:
+                if md not in present_channel_modes:
+                    continue
+                if mode_msg[0] == "+":
+                    modes.add(md)
+                    channel_mode = "+" + md
+                elif mode_msg[0] == "-":
+                    if md in modes:
+                        modes.discard(md)
+                        channel_mode = "-" + md
+                    else:
+                        PchumLog.warning("Can't remove channel mode that isn't set.")
+                updates.append(("", channel, f"{channel_mode}:{op}"))
+            self.mainwindow.modes = "+" + "".join(sorted(modes))
+            # Channel modes are handled, leave only user modes in the string.
+            mode_msg = mode_msg.translate(
+                str.maketrans("", "", "".join(present_channel_modes))
+            )
+
+        index = 0
+        for sign, letters in _MODE_BLOCK_RE.findall(mode_msg):
+            # Modes before any sign are treated as being set.
+            sign = sign or "+"
+            for l in letters:
+                mode = sign + l
+                # Server-set usermodes don't need to be passed.
+                if handles != [""] or l not in _SERVER_MODE_FLAGS:
+                    try:
+                        updates.append((handles[index], channel, f"{mode}:{op}"))
+                    except IndexError as index_except:
+                        PchumLog.exception("modeSetIndexError: %s", index_except)
+                index += 1
+        if updates:
+            self.userPresentUpdateBatch.emit(updates)
 
     def _invite(self, sender, _you, channel):
         """'INVITE' message from server, someone invited us to a channel.
 
         Pizza party everyone invited!!!"""
-        handle = sender.split("!")[0]
+        handle = sender.partition("!")[0]
         self.inviteReceived.emit(handle, channel)
 
     def _nick(self, oldnick, newnick, _hopcount=0):
@@ -859,17 +907,18 @@ class PesterIRC(QtCore.QThread):
 
         Is send when our or someone else's nick got changed willingly or unwillingly."""
         PchumLog.debug("NICK change from '%s' to '%s'.", oldnick, newnick)
+        my_handle = self.mainwindow.profile().handle
         # svsnick
-        if oldnick == self.mainwindow.profile().handle:
+        if oldnick == my_handle:
             # Server changed our handle, svsnick?
             self.getSvsnickedOn.emit(oldnick, newnick)
 
         # etc.
-        oldhandle = oldnick[0 : oldnick.find("!")]
-        if self.mainwindow.profile().handle in [newnick, oldhandle]:
+        oldhandle, _, _ = oldnick.partition("!")
+        if my_handle in [newnick, oldhandle]:
             self.myHandleChanged.emit(newnick)
         newchum = PesterProfile(newnick, chumdb=self.mainwindow.chumdb)
-        self.moodUpdated.emit(oldhandle, Mood("offline"))
+        self.moodUpdated.emit(oldhandle, MOOD_OFFLINE)
         self.userPresentUpdate.emit(f"{oldhandle}:{newnick}", "", "nick")
         if newnick in self.mainwindow.chumList.chums:
             self.get_mood(newchum)
@@ -889,17 +938,19 @@ class PesterIRC(QtCore.QThread):
         profile = self.mainwindow.profile()
         # Get mood
         mood = profile.mood.value_str()
-        # Moods via metadata
-        self._send_irc.metadata("*", "sub", "mood")
-        self._send_irc.metadata("*", "set", "mood", mood)
-        # Color via metadata
-        self._send_irc.metadata("*", "sub", "color")
-        self._send_irc.metadata("*", "set", "color", profile.color.name())
-        # Backwards compatible moods
-        if self.mainwindow.config.irc_compatibility_mode():
-            return
-        self._send_irc.join("#pesterchum")
-        self._send_irc.privmsg("#pesterchum", f"MOOD >{mood}")
+        # Send the welcome burst with a single write.
+        with self._send_irc.batch():
+            # Moods via metadata
+            self._send_irc.metadata("*", "sub", "mood")
+            self._send_irc.metadata("*", "set", "mood", mood)
+            # Color via metadata
+            self._send_irc.metadata("*", "sub", "color")
+            self._send_irc.metadata("*", "set", "color", profile.color.name())
+            # Backwards compatible moods
+            if self.mainwindow.config.irc_compatibility_mode():
+                return
+            self._send_irc.join("#pesterchum")
+            self._send_irc.privmsg("#pesterchum", f"MOOD >{mood}")
 
     def _featurelist(self, _target, _handle, *params):
         """Numerical reply 005 RPL_ISUPPORT to communicate supported server features.
@@ -913,6 +964,22 @@ class PesterIRC(QtCore.QThread):
             if any(feature.startswith("METADATA") for feature in features):
                 PchumLog.info("Server supports metadata.")
                 self.metadata_supported = True
+        for feature in features:
+            if feature.startswith("TARGMAX="):
+                # Format is TARGMAX=PRIVMSG:4,NOTICE:1,... empty means no limit.
+                for limit in feature[8:].split(","):
+                    command, _, maximum = limit.partition(":")
+                    if command.casefold() == "privmsg":
+                        if maximum.isdigit():
+                            maximum = int(maximum)
+                        else:
+                            maximum = _MAX_PRIVMSG_TARGETS
+                        self.privmsg_targmax = max(
+                            1, min(maximum, _MAX_PRIVMSG_TARGETS)
+                        )
+                        PchumLog.info(
+                            "Server supports %s PRIVMSG targets.", self.privmsg_targmax
+                        )
 
     def _cap(self, server, nick, subcommand, tag):
         """IRCv3 capabilities command from server.
@@ -931,6 +998,7 @@ class PesterIRC(QtCore.QThread):
     def _liststart(self, _server, _handle, *info):
         """Numeric reply 321 RPL_LISTSTART, start of list of channels."""
         self.channel_list = []
+        self._channel_set = set()
         info = list(info)
         self.channel_field = info.index("Channel")  # dunno if this is protocol
         PchumLog.info('---> recv "CHANNELS: %s ', self.channel_field)
@@ -939,7 +1007,8 @@ class PesterIRC(QtCore.QThread):
         """Numeric reply 322 RPL_LIST, returns part of the list of channels."""
         channel = info[self.channel_field]
         usercount = info[1]
-        if channel not in self.channel_list and channel != "#pesterchum":
+        if channel not in self._channel_set and channel != "#pesterchum":
+            self._channel_set.add(channel)
             self.channel_list.append((channel, usercount))
         PchumLog.info('---> recv "CHANNELS: %s ', channel)
 
@@ -948,6 +1017,7 @@ class PesterIRC(QtCore.QThread):
         PchumLog.info('---> recv "CHANNELS END"')
         self.channelListReceived.emit(PesterList(self.channel_list))
         self.channel_list = []
+        self._channel_set = set()
 
     def _channelmodeis(self, _server, _handle, channel, modes, _mode_params=""):
         """Numeric reply 324 RPL_CHANNELMODEIS, gives channel modes."""
@@ -956,30 +1026,26 @@ class PesterIRC(QtCore.QThread):
 
     def _namreply(self, _server, _nick, _op, channel, names):
         """Numeric reply 353 RPL_NAMREPLY, part of a NAMES list of members, usually of a channel."""
-        namelist = names.strip().split(" ")
-        namelist = [i for i in namelist if i]  # Remove empty entries
-        PchumLog.info('---> recv "NAMES %s: %s names"', channel, len(namelist))
-        if not hasattr(self, "channelnames"):
-            self.channelnames = {}
-        if channel not in self.channelnames:
-            self.channelnames[channel] = []
-        self.channelnames[channel].extend(namelist)
+        namelist = names.split()  # No-arg split drops empty entries.
+        if PchumLog.isEnabledFor(logging.INFO):
+            PchumLog.info('---> recv "NAMES %s: %s names"', channel, len(namelist))
+        # EON seems to return with wrong capitalization sometimes, so key on casefold.
+        key = channel.casefold()
+        if key not in self.channelnames:
+            self.channelnames[key] = []
+            self.channel_display[key] = channel
+        self.channelnames[key].extend(namelist)
 
     def _endofnames(self, _server, _nick, channel, _msg):
         """Numeric reply 366 RPL_ENDOFNAMES, end of NAMES list of members, usually of a channel."""
-        namelist = None
-        try:
-            namelist = self.channelnames[channel]
-        except KeyError:
-            # EON seems to return with wrong capitalization sometimes?
-            for channel_name in self.channelnames:
-                if channel.casefold() == channel_name.casefold():
-                    channel = channel_name
-                    namelist = self.channelnames[channel]
-        if channel in self.channelnames:
-            self.channelnames.pop(channel)
+        key = channel.casefold()
+        namelist = self.channelnames.pop(key, None)
+        # Use the capitalization the NAMES replies had.
+        channel = self.channel_display.pop(key, channel)
         if not namelist:
             return
+        # Servers may repeat a nick across NAMES replies, keep the first.
+        namelist = list(dict.fromkeys(namelist))
         self.namesReceived.emit(channel, PesterList(namelist))
         if channel == "#pesterchum" and not self.joined:
             self.joined = True
@@ -994,6 +1060,11 @@ class PesterIRC(QtCore.QThread):
                     lesschums.append(chum)
             self.get_mood(*lesschums)
 
+    def _toomanytargets(self, *params):
+        """Numeric reply 407 ERR_TOOMANYTARGETS, stop sending to multiple targets."""
+        PchumLog.warning("Too many targets: %s", params)
+        self.privmsg_targmax = 1
+
     def _cannotsendtochan(self, _server, _handle, channel, msg):
         """Numeric reply 404 ERR_CANNOTSENDTOCHAN, we aren't in the channel or don't have voice."""
         self.cannotSendToChan.emit(channel, msg)
@@ -1015,8 +1086,11 @@ class PesterIRC(QtCore.QThread):
 
     def _reset_nick(self, oldnick):
         """Set our nick to a random pesterClient."""
-        random_number = int(random.random() * 9999)  # Random int in range 0 <---> 9999
-        newnick = f"pesterClient{random_number}"
+        if not self._random_nick_numbers:
+            # Numbers in range 0 <---> 9999, shuffled so retries never repeat a nick.
+            self._random_nick_numbers = list(range(10000))
+            random.shuffle(self._random_nick_numbers)
+        newnick = f"pesterClient{self._random_nick_numbers.pop()}"
         self._send_irc.nick(newnick)
         self.nickCollision.emit(oldnick, newnick)
 
@@ -1052,21 +1126,21 @@ class PesterIRC(QtCore.QThread):
         PchumLog.info("_nomatchingkey: %s", failed_handle)
         # No point in GETMOOD-ing services
         # Fallback to the normal GETMOOD method if getting mood via metadata fails.
-        if failed_handle.casefold() not in SERVICES:
+        if failed_handle.casefold() not in SERVICES_CF:
             self._send_irc.privmsg("#pesterchum", f"GETMOOD {failed_handle}")
 
     def _keynotset(self, _target, _our_handle, failed_handle, _key, *_error):
         """METADATA DRAFT numeric reply 768 ERR_KEYNOTSET, key isn't set."""
         PchumLog.info("_keynotset: %s", failed_handle)
         # Fallback to the normal GETMOOD method if getting mood via metadata fails.
-        if failed_handle.casefold() not in SERVICES:
+        if failed_handle.casefold() not in SERVICES_CF:
             self._send_irc.privmsg("#pesterchum", f"GETMOOD {failed_handle}")
 
     def _keynopermission(self, _target, _our_handle, failed_handle, _key, *_error):
         """METADATA DRAFT numeric reply 769 ERR_KEYNOPERMISSION, no permission for key."""
         PchumLog.info("_keynopermission: %s", failed_handle)
         # Fallback to the normal GETMOOD method if getting mood via metadata fails.
-        if failed_handle.casefold() not in SERVICES:
+        if failed_handle.casefold() not in SERVICES_CF:
             self._send_irc.privmsg("#pesterchum", f"GETMOOD {failed_handle}")
 
     def _metadatasubok(self, *params):
@@ -1110,6 +1184,7 @@ class PesterIRC(QtCore.QThread):
     connected = QtCore.pyqtSignal()
     askToConnect = QtCore.pyqtSignal(Exception)
     userPresentUpdate = QtCore.pyqtSignal(str, str, str)
+    userPresentUpdateBatch = QtCore.pyqtSignal(list)
     cannotSendToChan = QtCore.pyqtSignal(str, str)
     signal_forbiddenchannel = QtCore.pyqtSignal(str, str)
     cap_negotation_started = QtCore.pyqtSignal()
@@ -1645,7 +1645,7 @@ class PesterMemo(PesterConvo):
                 if update == "netsplit":
                     self.netsplit.extend(allinitials)
                 else:
-                    msg = chum.memoclosemsg(
+                    msg = chum.memoclosemsg_multi(
                         systemColor,
                         allinitials,
                         self.mainwindow.theme["convo/text/closememo"],
@@ -1241,11 +1241,9 @@ class PesterChooseProfile(QtWidgets.QDialog):
             if not PesterProfile.checkLength(handle):
                 self.errorMsg.setText("PROFILE HANDLE IS TOO LONG")
                 return
-            if not PesterProfile.checkValid(handle)[0]:
-                self.errorMsg.setText(
-                    "NOT A VALID CHUMTAG. REASON:\n%s"
-                    % (PesterProfile.checkValid(handle)[1])
-                )
+            valid = PesterProfile.checkValid(handle)
+            if not valid[0]:
+                self.errorMsg.setText("NOT A VALID CHUMTAG. REASON:\n%s" % (valid[1]))
                 return
         self.accept()
 
@@ -89,6 +89,10 @@ class Mood:
         return PesterIcon(f)
 
 
+# Shared "offline" mood, safe to reuse since Mood objects are never mutated.
+MOOD_OFFLINE = Mood("offline")
+
+
 class PesterMoodAction(QtCore.QObject):
     def __init__(self, m, func):
         QtCore.QObject.__init__(self)
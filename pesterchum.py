@@ -1800,7 +1800,7 @@ class PesterWindow(MovingWindow):
         event.accept()
 
     def newMessage(self, handle, msg):
-        if handle in self.config.getBlocklist():
+        if self.config.isBlocked(handle):
             # yeah suck on this
             if not self.config.irc_compatibility_mode():
                 self.sendMessage.emit("PESTERCHUM:BLOCKED", handle)
@@ -2637,6 +2637,12 @@ class PesterWindow(MovingWindow):
         # PchumLog.debug("handle=%s\nchannel=%s\nupdate=%s\n" % (handle, channel, update))
         self.userPresentSignal.emit(handle, channel, update)
 
+    @QtCore.pyqtSlot(list)
+    def userPresentUpdateBatch(self, updates):
+        """Apply a list of (handle, channel, update) tuples, as sent for MODE."""
+        for handle, channel, update in updates:
+            self.userPresentUpdate(handle, channel, update)
+
     @QtCore.pyqtSlot()
     def addChumWindow(self):
         if not hasattr(self, "addchumdialog"):
@@ -4234,6 +4240,7 @@ class MainProgram(QtCore.QObject):
             (irc.myHandleChanged, widget.myHandleChanged),
             (irc.namesReceived, widget.updateNames),
             (irc.userPresentUpdate, widget.userPresentUpdate),
+            (irc.userPresentUpdateBatch, widget.userPresentUpdateBatch),
             (irc.channelListReceived, widget.updateChannelList),
             (irc.timeCommand, widget.timeCommand),
             (irc.chanInviteOnly, widget.chanInviteOnly),
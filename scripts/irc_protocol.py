@@ -1,21 +1,56 @@
 """IRC-related functions and classes to be imported by irc.py"""
 
 import ssl
+import sys
 import time
 import base64
 import logging
+import threading
+import contextlib
 
 PchumLog = logging.getLogger("pchumLogger")
 
 
+class _BatchLocal(threading.local):
+    """Per-thread batch() buffer, the class default makes the lookup always hit."""
+
+    batch = None
+
+
 class SendIRC:
     """Provides functions for outgoing IRC commands.
 
     Functions are protocol compliant but don't implement all valid uses of certain commands.
     """
 
+    # Prefixes of frequently sent commands, see _send_prefixed.
+    _PING = "PING :"
+    _PONG = "PONG "
+    _NAMES = "NAMES "
+    _PART = "PART "
+    _LIST = b"LIST\r\n"  # Takes no arguments, so sent as-is.
+
     def __init__(self):
         self.socket = None  # INET socket connected with server.
+        # Per-thread buffer for batch(), both the IRC and main thread send.
+        self._local = _BatchLocal()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Queue commands sent within the 'with' block and send them with one write.
+
+        Nested batches are merged into the outermost one."""
+        if self._local.batch is not None:
+            yield
+            return
+        self._local.batch = bytearray()
+        try:
+            yield
+            outgoing_bytes = bytes(self._local.batch)
+        finally:
+            self._local.batch = None
+        if outgoing_bytes:
+            self._write(outgoing_bytes)
 
     def _send(self, *args: str, text=None):
         """Send a command to the IRC server.
@@ -24,34 +59,46 @@ class SendIRC:
         The 'text' argument is for the final parameter, which can have spaces.
 
         Since this checks if the socket is alive, it's best to send via this method."""
-        # Return if disconnected
-        if not self.socket or self.socket.fileno() == -1:
-            PchumLog.error(
-                "Send attempted while disconnected, args: %s, text: %s.", args, text
-            )
-            return
-
-        command = ""
-        # Convert command arguments to a single string if passed.
-        if args:
-            command += " ".join(args)
+        # Build the whole line at once, ending with characters for end of line in IRC.
         # If text is passed, add ':' to imply everything after it is one parameter.
         if text:
-            command += f" :{text}"
-        # Add characters for end of line in IRC.
-        command += "\r\n"
+            command = f"{' '.join(args)} :{text}\r\n"
+        else:
+            command = f"{' '.join(args)}\r\n"
         # UTF-8 is the prefered encoding in 2023.
         outgoing_bytes = command.encode(encoding="utf-8", errors="replace")
+        PchumLog.debug("Sending: %s", command)
+        self._write(outgoing_bytes)
+
+    def _send_prefixed(self, prefix: str, arg: str):
+        """Send a command made of a constant prefix and a single argument.
+
+        Used for frequent commands like PING/PONG, skips the join done in _send."""
+        command = f"{prefix}{arg}\r\n"
+        PchumLog.debug("Sending: %s", command)
+        self._write(command.encode(encoding="utf-8", errors="replace"))
+
+    def _write(self, outgoing_bytes: bytes):
+        """Queue encoded IRC lines if batching, otherwise write them to the socket.
+
+        Retries on errors, the socket is killed after three failed tries."""
+        batch = self._local.batch
+        if batch is not None:
+            batch.extend(outgoing_bytes)
+            return
+        if not self.socket or self.socket.fileno() == -1:
+            PchumLog.error("Send attempted while disconnected: %s", outgoing_bytes)
+            return
 
         tries = 0
         while True:
             try:
-                PchumLog.debug("Sending: %s", command)
-                self.socket.sendall(outgoing_bytes)  # sendall will fix this (no)
+                # sendall() loops until everything is written, send() may not.
+                self.socket.sendall(outgoing_bytes)
                 return
             except (OSError, ssl.SSLEOFError) as err:
                 tries += 1
-                PchumLog.exception("Error while sending: '%s'", command.strip())
+                PchumLog.exception("Error while sending: '%s'", outgoing_bytes.strip())
                 time.sleep(0.413)
                 if tries >= 3:
                     PchumLog.error("Too many tries!!! killing socket")
@@ -60,11 +107,15 @@ class SendIRC:
 
     def ping(self, token):
         """Send PING command to server to check for connectivity."""
-        self._send("PING", text=token)
+        if not token:
+            # An empty token is sent as a bare 'PING', not 'PING :'.
+            self._send("PING")
+            return
+        self._send_prefixed(self._PING, token)
 
     def pong(self, token):
         """Send PONG command to reply to server PING."""
-        self._send("PONG", token)
+        self._send_prefixed(self._PONG, token)
 
     def pass_(self, password):
         """Send a 'connection password' to the server.
@@ -81,13 +132,25 @@ class SendIRC:
         self._send("USER", username, "0", "*", text=realname)
 
     def privmsg(self, target, text):
-        """Send PRIVMSG command to send a message."""
-        for line in text.split("\n"):
-            self._send("PRIVMSG", target, text=line)
+        """Send PRIVMSG command to send a message.
+
+        Multi-line text is sent as one PRIVMSG per line, in a single write."""
+        # Empty lines get no ':' parameter, same as _send.
+        if "\n" not in text:
+            outgoing = (
+                f"PRIVMSG {target} :{text}\r\n" if text else f"PRIVMSG {target}\r\n"
+            )
+        else:
+            outgoing = "".join(
+                f"PRIVMSG {target} :{line}\r\n" if line else f"PRIVMSG {target}\r\n"
+                for line in text.split("\n")
+            )
+        PchumLog.debug("Sending: %s", outgoing)
+        self._write(outgoing.encode(encoding="utf-8", errors="replace"))
 
     def names(self, channel):
         """Send NAMES command to view channel members."""
-        self._send("NAMES", channel)
+        self._send_prefixed(self._NAMES, channel)
 
     def kick(self, channel, user, reason=""):
         """Send KICK command to force user from channel."""
@@ -98,21 +161,23 @@ class SendIRC:
 
     def mode(self, target, modestring="", mode_arguments=""):
         """Set or remove modes from target."""
-        outgoing_mode = " ".join([target, modestring, mode_arguments]).strip()
-        self._send("MODE", outgoing_mode)
+        if mode_arguments:
+            self._send("MODE", target, modestring, mode_arguments)
+        elif modestring:
+            self._send("MODE", target, modestring)
+        else:
+            self._send("MODE", target)
 
     def ctcp(self, target, command, msg=""):
         """Send Client-to-Client Protocol message."""
-        outgoing_ctcp = " ".join(
-            [command, msg]
-        ).strip()  # Extra spaces break protocol, so strip.
+        # Extra spaces break protocol, so only add msg if there is one.
+        outgoing_ctcp = f"{command} {msg}" if msg else command
         self.privmsg(target, f"\x01{outgoing_ctcp}\x01")
 
     def ctcp_reply(self, target, command, msg=""):
         """Send Client-to-Client Protocol reply message, responding to a CTCP message."""
-        outgoing_ctcp = " ".join(
-            [command, msg]
-        ).strip()  # Extra spaces break protocol, so strip.
+        # Extra spaces break protocol, so only add msg if there is one.
+        outgoing_ctcp = f"{command} {msg}" if msg else command
         self.notice(target, f"\x01{outgoing_ctcp}\x01")
 
     def metadata(self, target, subcommand, *params):
@@ -134,15 +199,17 @@ class SendIRC:
 
         Keys or joining multiple channels is possible in the specification, but unused.
         """
-        channel_and_key = " ".join([channel, key]).strip()
-        self._send("JOIN", channel_and_key)
+        if key:
+            self._send("JOIN", channel, key)
+        else:
+            self._send("JOIN", channel)
 
     def part(self, channel):
         """Send PART command to leave a channel/memo.
 
         Providing a reason or leaving multiple channels is possible in the specification.
         """
-        self._send("PART", channel)
+        self._send_prefixed(self._PART, channel)
 
     def notice(self, target, text):
         """Send a NOTICE to a user or channel."""
@@ -163,7 +230,8 @@ class SendIRC:
 
     def list(self):
         """Send LIST command to get list of channels."""
-        self._send("LIST")
+        PchumLog.debug("Sending: %s", self._LIST)
+        self._write(self._LIST)
 
     def quit(self, reason=""):
         """Send QUIT to terminate connection."""
@@ -194,30 +262,24 @@ class SendIRC:
 
 def parse_irc_line(line: str):
     """Retrieves tags, prefix, command, and arguments from an unparsed IRC line."""
-    parts = line.split(" ")
     tags = None
     prefix = None
-    if parts[0].startswith(":"):
-        prefix = parts[0][1:]
-        command = parts[1]
-        args = parts[2:]
-    elif parts[0].startswith("@"):
-        tags = parts[0]  # IRCv3 message tag
-        prefix = parts[1][1:]
-        command = parts[2]
-        args = parts[3:]
-    else:
-        command = parts[0]
-        args = parts[1:]
-    command = command.casefold()
+    if line.startswith("@"):
+        tags, _, line = line.partition(" ")  # IRCv3 message tag
+    if line.startswith(":"):
+        prefix, _, line = line.partition(" ")
+        prefix = prefix[1:]
+    command, _, rest = line.partition(" ")
+    # Interned so the dispatch dict and tagmsg check can match on identity.
+    command = sys.intern(command.casefold())
 
     # If ':' is present the subsequent args are one parameter.
-    fused_args = []
-    for idx, arg in enumerate(args):
-        if arg.startswith(":"):
-            final_param = " ".join(args[idx:])
-            fused_args.append(final_param[1:])
-            break
-        fused_args.append(arg)
-
-    return (tags, prefix, command, fused_args)
+    if rest.startswith(":"):
+        args = [rest[1:]]
+    else:
+        head, sep, final_param = rest.partition(" :")
+        args = head.split(" ") if head else []
+        if sep:
+            args.append(final_param)
+
+    return (tags, prefix, command, args)
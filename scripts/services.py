@@ -25,6 +25,8 @@ SERVICES = [
     "metaserv",  # DalekIRC
     "bbserv",  # DalekIRC
 ]
+# Casefolded set of SERVICES for fast membership tests.
+SERVICES_CF = frozenset(service.casefold() for service in SERVICES)
 # Pesterchum bots
 CUSTOMBOTS = ["calsprite", RANDNICK.casefold()]
 # All bots
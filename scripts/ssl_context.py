@@ -22,9 +22,15 @@ except ImportError:
             "Failed to import certifi, Pesterchum will not be able to validate "
             "certificates if the system-provided root certificates are invalid."
         )
+else:
+    # Release date of the certifi bundle, certifi is versioned by date.
+    _CERTIFI_DATE = datetime.datetime.strptime(certifi.__version__, "%Y.%m.%d")
 
+# Contexts already created by get_ssl_context, keyed by 'verify_hostname'.
+_ssl_context_cache = {}
 
-def get_ssl_context():
+
+def get_ssl_context(verify_hostname=True):
     """Returns an SSL context for connecting over SSL/TLS.
     Loads the certifi root certificate bundle if the certifi module is less
     than a year old or if the system certificate store is empty.
@@ -34,15 +40,25 @@ def get_ssl_context():
 
     On MacOS the system cert store is usually empty, as Python does not use
     the system provided ones, instead relying on a bundle installed with the
-    python installer."""
+    python installer.
+
+    Contexts are cached per 'verify_hostname' value, so reconnecting
+    doesn't reload the certificate bundle."""
+    if verify_hostname in _ssl_context_cache:
+        return _ssl_context_cache[verify_hostname]
+    context = _create_ssl_context()
+    context.check_hostname = verify_hostname
+    _ssl_context_cache[verify_hostname] = context
+    return context
+
+
+def _create_ssl_context():
     default_context = ssl.create_default_context()
     if "certifi" not in globals():
         return default_context
 
     # Get age of certifi module
-    certifi_date = datetime.datetime.strptime(certifi.__version__, "%Y.%m.%d")
-    current_date = datetime.datetime.now()
-    certifi_age = current_date - certifi_date
+    certifi_age = datetime.datetime.now() - _CERTIFI_DATE
 
     empty_cert_store = list(default_context.cert_store_stats().values()).count(0) == 3
     # 94672800 seconds is approximately 3 years
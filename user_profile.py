@@ -159,6 +159,8 @@ class userConfig:
         self.NEWCONVO = 8
         self.INITIALS = 16
         self.filename = _datadir + "pesterchum.js"
+        # Set form of the blocklist, rebuilt lazily after it changes.
+        self._blockset = None
         try:
             with open(self.filename) as fp:
                 self.config = json.load(fp)
@@ -409,6 +411,11 @@ with a backup from: <a href='%s'>%s</a></h3></html>"
             self.set("block", [])
         return self.config["block"]
 
+    def isBlocked(self, handle):
+        if self._blockset is None:
+            self._blockset = frozenset(self.getBlocklist())
+        return handle in self._blockset
+
     def addBlocklist(self, handle):
         l = self.getBlocklist()
         if handle not in l:
@@ -559,6 +566,8 @@ with a backup from: <a href='%s'>%s</a></h3></html>"
 
     def set(self, item, setting):
         self.config[item] = setting
+        if item == "block":
+            self._blockset = None
         try:
             jsonoutput = json.dumps(self.config)
         except ValueError as e:
@@ -984,6 +993,7 @@ class pesterTheme(dict):
                 break
 
         self.name = name
+        self._moodIconUrls = {}
         try:
             with open(self.path + "/style.js") as fp:
                 theme = json.load(fp, object_hook=self.pathHook)
@@ -1018,6 +1028,15 @@ class pesterTheme(dict):
                     raise e
         return v
 
+    def moodIconUrl(self, mood):
+        """Icon path for a mood name, with spaces escaped for use in <img> tags."""
+        try:
+            return self._moodIconUrls[mood]
+        except KeyError:
+            url = self["main/chums/moods"][mood]["icon"].replace(" ", "%20")
+            self._moodIconUrls[mood] = url
+            return url
+
     def pathHook(self, dict):
         # This converts strings containing $path into the proper paths
         # Honestly ive never even seen this Template stuff before. very funky!